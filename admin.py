@@ -4,7 +4,7 @@ Admin dashboard and monitoring endpoints.
 import os
 from typing import Optional
 from fastapi import HTTPException, Header
-import aiosqlite
+from db_pool import pool
 
 
 ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "change-this-admin-key")
@@ -17,18 +17,17 @@ def verify_admin_key(x_admin_key: Optional[str] = Header(None)):
     return x_admin_key
 
 
-async def get_system_stats(db_path: str = "./data.db"):
+async def get_system_stats():
     """Get system-wide statistics."""
-    async with aiosqlite.connect(db_path) as db:
-        # Total users
-        async with db.execute("SELECT COUNT(*) FROM users WHERE is_active = 1") as cursor:
-            row = await cursor.fetchone()
-            total_users = row[0] if row else 0
-        
-        # Total API keys
-        async with db.execute("SELECT COUNT(*) FROM api_keys WHERE is_active = 1") as cursor:
-            row = await cursor.fetchone()
-            total_keys = row[0] if row else 0
+    async with pool.acquire() as db:
+        # Active users and API keys (trigger-maintained counters)
+        async with db.execute("""
+            SELECT name, value FROM counters
+            WHERE name IN ('active_users', 'active_api_keys')
+        """) as cursor:
+            counters = {row[0]: row[1] async for row in cursor}
+            total_users = counters.get("active_users", 0)
+            total_keys = counters.get("active_api_keys", 0)
         
         # API keys by plan
         async with db.execute("""
@@ -41,39 +40,31 @@ async def get_system_stats(db_path: str = "./data.db"):
             async for row in cursor:
                 plan_distribution[row[0]] = row[1]
         
-        # Total requests (last 24 hours)
-        async with db.execute("""
-            SELECT COUNT(*) 
-            FROM usage_logs 
-            WHERE timestamp >= datetime('now', '-1 day')
-        """) as cursor:
-            row = await cursor.fetchone()
-            requests_24h = row[0] if row else 0
-        
-        # Total requests (last 7 days)
-        async with db.execute("""
-            SELECT COUNT(*) 
-            FROM usage_logs 
-            WHERE timestamp >= datetime('now', '-7 days')
-        """) as cursor:
-            row = await cursor.fetchone()
-            requests_7d = row[0] if row else 0
-        
-        # Average response time
+        # Requests, latency and error rate from the hourly rollup
         async with db.execute("""
-            SELECT AVG(response_time_ms) 
-            FROM usage_logs 
-            WHERE timestamp >= datetime('now', '-1 day')
-            AND response_time_ms IS NOT NULL
+            SELECT
+                SUM(CASE WHEN hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-1 day') THEN count ELSE 0 END) as c24,
+                SUM(count) as c7,
+                SUM(CASE WHEN hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-1 day') THEN total_rt END) * 1.0
+                    / SUM(CASE WHEN hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-1 day') THEN rt_count END) as avg_rt_24,
+                SUM(CASE WHEN hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-1 day') AND status_bucket >= 4 THEN count ELSE 0 END) as err_24,
+                MAX(hour) as latest_hour
+            FROM usage_hourly_rollup
+            WHERE hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-7 days')
         """) as cursor:
             row = await cursor.fetchone()
-            avg_response_time = round(row[0], 2) if row and row[0] else 0
+            requests_24h = row[0] or 0
+            requests_7d = row[1] or 0
+            avg_response_time = round(row[2], 2) if row[2] else 0
+            errors = row[3] or 0
+            error_rate = round((errors / requests_24h * 100) if requests_24h > 0 else 0, 2)
+            latest_hour = row[4]
         
         # Top endpoints
         async with db.execute("""
-            SELECT endpoint, COUNT(*) as count
-            FROM usage_logs
-            WHERE timestamp >= datetime('now', '-7 days')
+            SELECT endpoint, SUM(count) as count
+            FROM usage_hourly_rollup
+            WHERE hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-7 days')
             GROUP BY endpoint
             ORDER BY count DESC
             LIMIT 10
@@ -82,19 +73,6 @@ async def get_system_stats(db_path: str = "./data.db"):
             async for row in cursor:
                 top_endpoints.append({"endpoint": row[0], "count": row[1]})
         
-        # Error rate
-        async with db.execute("""
-            SELECT 
-                COUNT(CASE WHEN status_code >= 400 THEN 1 END) as errors,
-                COUNT(*) as total
-            FROM usage_logs
-            WHERE timestamp >= datetime('now', '-1 day')
-        """) as cursor:
-            row = await cursor.fetchone()
-            errors = row[0] if row else 0
-            total = row[1] if row else 1
-            error_rate = round((errors / total * 100) if total > 0 else 0, 2)
-        
         return {
             "users": {
                 "total": total_users,
@@ -109,14 +87,18 @@ async def get_system_stats(db_path: str = "./data.db"):
             "performance": {
                 "error_rate_percent": error_rate,
                 "top_endpoints": top_endpoints
+            },
+            "freshness": {
+                "source": "usage_hourly_rollup",
+                "granularity": "hour",
+                "latest_hour": latest_hour
             }
         }
 
 
-async def get_recent_users(db_path: str = "./data.db", limit: int = 20):
+async def get_recent_users(limit: int = 20):
     """Get recently registered users."""
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.acquire() as db:
         async with db.execute("""
             SELECT u.id, u.email, u.created_at, 
                    k.plan_tier, k.created_at as key_created
@@ -138,21 +120,29 @@ async def get_recent_users(db_path: str = "./data.db", limit: int = 20):
             return users
 
 
-async def get_usage_by_user(db_path: str = "./data.db", limit: int = 20):
+async def get_usage_by_user(limit: int = 20):
     """Get top users by request volume."""
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.acquire() as db:
+        # Aggregate per key on the (api_key_id, timestamp) index, then join
+        # only the keys that have traffic to their users
         async with db.execute("""
+            WITH key_usage AS (
+                SELECT api_key_id,
+                    COUNT(*) as requests,
+                    MAX(timestamp) as last_request
+                FROM usage_logs
+                WHERE timestamp >= datetime('now', '-7 days')
+                GROUP BY api_key_id
+            )
             SELECT 
                 u.email,
                 k.plan_tier,
-                COUNT(l.id) as total_requests,
-                MAX(l.timestamp) as last_request
-            FROM users u
-            JOIN api_keys k ON u.id = k.user_id
-            LEFT JOIN usage_logs l ON k.id = l.api_key_id
+                SUM(ku.requests) as total_requests,
+                MAX(ku.last_request) as last_request
+            FROM key_usage ku
+            JOIN api_keys k ON k.id = ku.api_key_id
+            JOIN users u ON u.id = k.user_id
             WHERE u.is_active = 1
-            AND l.timestamp >= datetime('now', '-7 days')
             GROUP BY u.id
             ORDER BY total_requests DESC
             LIMIT ?
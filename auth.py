@@ -2,11 +2,12 @@
 Authentication and rate limiting middleware.
 """
 from fastapi import Header, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-import time
+import asyncio
+from datetime import datetime
 from typing import Optional
 import database
 
@@ -23,27 +24,28 @@ async def verify_api_key_dependency(x_api_key: str = Header(...)) -> dict:
 
 
 async def log_request_middleware(request: Request, call_next):
-    """Middleware to log API requests and track usage."""
-    start_time = time.time()
+    """Middleware to log API requests and track usage.
 
-    # Extract API key from headers
-    api_key = request.headers.get("x-api-key")
+    Must be installed together with rate_limit_middleware, which verifies
+    the API key and stores it on request.state.
+    """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
 
     response = await call_next(request)
 
     # Calculate response time
-    response_time_ms = int((time.time() - start_time) * 1000)
-
-    # Log usage if API key is present and valid
-    if api_key:
-        key_info = await database.verify_api_key(api_key)
-        if key_info:
-            await database.log_usage(
-                api_key_id=key_info["api_key_id"],
-                endpoint=request.url.path,
-                response_time_ms=response_time_ms,
-                status_code=response.status_code
-            )
+    response_time_ms = int((loop.time() - start_time) * 1000)
+
+    # Log usage for API routes; rate_limit_middleware has already verified the key
+    key_info = getattr(request.state, "key_info", None)
+    if key_info and request.url.path.startswith("/api/"):
+        await database.log_usage(
+            api_key_id=key_info["api_key_id"],
+            endpoint=request.url.path,
+            response_time_ms=response_time_ms,
+            status_code=response.status_code
+        )
 
     # Add custom headers
     response.headers["X-Response-Time"] = f"{response_time_ms}ms"
@@ -70,39 +72,48 @@ async def rate_limit_middleware(request: Request, call_next):
     key_info = await database.verify_api_key(api_key)
     if not key_info:
         return await call_next(request)  # Let endpoint handle invalid key
+    request.state.key_info = key_info
 
-    # Get usage stats (check daily usage)
-    stats = await database.get_usage_stats(key_info["api_key_id"], days=1)
+    # Check today's usage against the plan limit
+    limit = database.RATE_LIMITS.get(key_info["plan_tier"], 10)
+    used = await database.get_daily_usage(key_info["api_key_id"], cap=limit)
+    reset_in = _seconds_until_reset()
 
-    if stats["remaining"] <= 0:
-        return JSONResponse(
+    if used >= limit:
+        return ORJSONResponse(
             status_code=429,
             content={
                 "error": "Rate limit exceeded",
-                "plan": stats["plan_tier"],
-                "limit": stats["rate_limit"],
-                "used": stats["total_calls"],
-                "resets_in": "24 hours"
+                "plan": key_info["plan_tier"],
+                "limit": limit,
+                "used": used,
+                "resets_in": f"{reset_in} seconds"
             },
             headers={
-                "X-RateLimit-Limit": str(stats["rate_limit"]),
+                "X-RateLimit-Limit": str(limit),
                 "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": "86400"
+                "X-RateLimit-Reset": str(reset_in)
             }
         )
 
     # Add rate limit headers
     response = await call_next(request)
-    response.headers["X-RateLimit-Limit"] = str(stats["rate_limit"])
-    response.headers["X-RateLimit-Remaining"] = str(stats["remaining"])
-    response.headers["X-RateLimit-Reset"] = "86400"  # 24 hours in seconds
+    response.headers["X-RateLimit-Limit"] = str(limit)
+    response.headers["X-RateLimit-Remaining"] = str(limit - used)
+    response.headers["X-RateLimit-Reset"] = str(reset_in)
 
     return response
 
 
+def _seconds_until_reset() -> int:
+    """Seconds until daily limits reset at UTC midnight."""
+    now = datetime.utcnow()
+    return 86400 - (now.hour * 3600 + now.minute * 60 + now.second)
+
+
 def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
     """Handler for rate limit exceeded errors."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=429,
         content={
             "error": "Too many requests",
@@ -2,17 +2,22 @@
 Shared database module for user management and API key tracking.
 """
 import aiosqlite
+import asyncio
 import hashlib
+import logging
 import secrets
 import jwt
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
+from cachetools import TTLCache
 from typing import Optional
 import os
+from db_pool import DB_PATH, pool
+
+logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-DB_PATH = os.getenv("DATABASE_URL", "sqlite:///./data.db").replace("sqlite:///", "")
 JWT_SECRET = os.getenv("JWT_SECRET", "change-this-jwt-secret-in-production")
 # Security check - fail if using default JWT secret
 if JWT_SECRET == "change-this-jwt-secret-in-production":
@@ -24,10 +29,75 @@ if JWT_SECRET == "change-this-jwt-secret-in-production":
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_DAYS = 30
 
+# Daily request limits per plan tier
+RATE_LIMITS = {
+    "free": int(os.getenv("RATE_LIMIT_FREE", "10")),
+    "starter": int(os.getenv("RATE_LIMIT_STARTER", "500")),
+    "pro": int(os.getenv("RATE_LIMIT_PRO", "5000")),
+    "enterprise": int(os.getenv("RATE_LIMIT_ENTERPRISE", "999999"))
+}
+
+# Verified API keys by key hash; entries expire so deactivated keys drop out
+API_KEY_CACHE_TTL = int(os.getenv("API_KEY_CACHE_TTL", "60"))
+_api_key_cache = TTLCache(maxsize=10_000, ttl=API_KEY_CACHE_TTL)
+
+# Usage logs are queued and written in batches by a background task
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 0.05  # seconds
+LOG_QUEUE_MAXSIZE = 10_000
+# Created by init_database so they belong to the event loop that runs the app
+_log_queue: Optional[asyncio.Queue] = None
+_log_writer_task: Optional[asyncio.Task] = None
+
+# Calls per (api_key_id, UTC day), loaded from usage_logs on first use
+_usage_counters: dict[tuple[int, str], int] = {}
+_usage_counters_lock: Optional[asyncio.Lock] = None
+_usage_counters_day: Optional[str] = None
+# UTC hour the rollup was last pruned, so the DELETE runs once an hour
+_rollup_pruned_hour: Optional[str] = None
+
+# Hot-path queries; sqlite3 keeps each pooled connection's prepared statements by SQL text
+VERIFY_KEY_SQL = """
+    SELECT ak.id, ak.user_id, ak.plan_tier, ak.key_hash, u.is_active as user_active
+    FROM api_keys ak
+    JOIN users u ON ak.user_id = u.id
+    WHERE ak.key_hash IN (?, ?) AND ak.is_active = 1
+"""
+
+INSERT_USAGE_SQL = """
+    INSERT INTO usage_logs (api_key_id, endpoint, response_time_ms, status_code)
+    VALUES (?, ?, ?, ?)
+"""
+
+UPSERT_ROLLUP_SQL = """
+    INSERT INTO usage_hourly_rollup (hour, endpoint, status_bucket, count, rt_count, total_rt)
+    VALUES (strftime('%Y-%m-%d %H:00:00', 'now'), ?, ?, ?, ?, ?)
+    ON CONFLICT (hour, endpoint, status_bucket) DO UPDATE SET
+        count = count + excluded.count,
+        rt_count = rt_count + excluded.rt_count,
+        total_rt = total_rt + excluded.total_rt
+"""
+
+# Admin stats only read the last 7 days of the rollup
+PRUNE_ROLLUP_SQL = """
+    DELETE FROM usage_hourly_rollup
+    WHERE hour < strftime('%Y-%m-%d %H:00:00', 'now', '-7 days')
+"""
+
+COUNT_USAGE_SQL = """
+    SELECT COUNT(*) FROM (
+        SELECT 1
+        FROM usage_logs
+        WHERE api_key_id = ?
+        AND timestamp >= datetime('now', 'start of day')
+        LIMIT ?
+    )
+"""
+
 
 async def init_database():
     """Initialize database tables."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         # Users table
         await db.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -66,8 +136,91 @@ async def init_database():
             )
         """)
 
+        # Hourly usage rollup for the admin dashboard, maintained by the log writer
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS usage_hourly_rollup (
+                hour TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                status_bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                rt_count INTEGER NOT NULL DEFAULT 0,
+                total_rt INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hour, endpoint, status_bucket)
+            )
+        """)
+
+        # Backfill the rollup from existing logs the first time it is created
+        await db.execute("""
+            INSERT INTO usage_hourly_rollup (hour, endpoint, status_bucket, count, rt_count, total_rt)
+            SELECT strftime('%Y-%m-%d %H:00:00', timestamp),
+                endpoint,
+                COALESCE(status_code, 0) / 100,
+                COUNT(*),
+                COUNT(response_time_ms),
+                COALESCE(SUM(response_time_ms), 0)
+            FROM usage_logs
+            WHERE timestamp >= datetime('now', '-7 days')
+            AND NOT EXISTS (SELECT 1 FROM usage_hourly_rollup)
+            GROUP BY 1, 2, 3
+        """)
+
+        # Row counters kept current by triggers so dashboards avoid COUNT(*) scans
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        for counter, table in (("active_users", "users"), ("active_api_keys", "api_keys")):
+            # Seed from the table the first time, before the triggers exist
+            await db.execute(f"""
+                INSERT OR IGNORE INTO counters (name, value)
+                SELECT '{counter}', COUNT(*) FROM {table} WHERE is_active = 1
+            """)
+            await db.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_counter_ai AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE counters SET value = value + (NEW.is_active IS 1) WHERE name = '{counter}';
+                END
+            """)
+            await db.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_counter_ad AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE counters SET value = value - (OLD.is_active IS 1) WHERE name = '{counter}';
+                END
+            """)
+            await db.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_counter_au AFTER UPDATE OF is_active ON {table}
+                BEGIN
+                    UPDATE counters
+                    SET value = value + (NEW.is_active IS 1) - (OLD.is_active IS 1)
+                    WHERE name = '{counter}';
+                END
+            """)
+
+        # Indexes for time-windowed analytics, rate limit checks and key listings
+        # (key_hash and email are already covered by their UNIQUE constraints)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_usage_ts ON usage_logs(timestamp)
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_usage_key_ts ON usage_logs(api_key_id, timestamp)
+        """)
+        # Top endpoints come from usage_hourly_rollup, so this index only slowed inserts
+        await db.execute("DROP INDEX IF EXISTS idx_usage_endpoint")
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_api_keys_user ON api_keys(user_id)
+        """)
+
+        # Refresh planner statistics; analysis_limit keeps this fast on large logs
+        await db.execute("PRAGMA analysis_limit=1000")
+        await db.execute("ANALYZE")
+
         # Add demo key if it doesn't exist
-        demo_key_hash = hashlib.sha256(b"demo-key-2024").hexdigest()
+        demo_key_hash = hash_api_key("demo-key-2024")
+        await db.execute("""
+            UPDATE api_keys SET key_hash = ? WHERE key_hash = ?
+        """, (demo_key_hash, _legacy_api_key_hash("demo-key-2024")))
         await db.execute("""
             INSERT OR IGNORE INTO users (id, email, password_hash)
             VALUES (1, 'demo@example.com', 'demo')
@@ -79,6 +232,38 @@ async def init_database():
 
         await db.commit()
 
+    global _log_queue, _log_writer_task, _usage_counters_lock
+    if _log_writer_task is None:
+        _log_queue = asyncio.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+        _usage_counters_lock = asyncio.Lock()
+        _log_writer_task = asyncio.create_task(_log_writer(_log_queue))
+
+
+async def close_database():
+    """Flush queued usage logs and close pooled connections."""
+    global _log_queue, _log_writer_task, _usage_counters_lock
+    if _log_writer_task is not None:
+        if not _log_writer_task.done():
+            await _log_queue.put(None)
+        try:
+            await _log_writer_task
+        except Exception as e:
+            logger.error(f"Usage log writer failed: {str(e)}")
+        _log_writer_task = None
+
+    rows = []
+    while _log_queue is not None and not _log_queue.empty():
+        row = _log_queue.get_nowait()
+        if row is not None:
+            rows.append(row)
+    if rows:
+        await _write_usage_rows(rows)
+
+    _log_queue = None
+    _usage_counters_lock = None
+    _usage_counters.clear()
+    await pool.close()
+
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
@@ -121,22 +306,35 @@ def generate_api_key() -> tuple[str, str, str]:
     prefix = secrets.token_hex(4)  # 8 chars
     suffix = secrets.token_hex(16)  # 32 chars
     full_key = f"{prefix}-{suffix}"
-    key_hash = hashlib.sha256(full_key.encode()).hexdigest()
+    key_hash = hash_api_key(full_key)
     return full_key, key_hash, prefix
 
 
+def hash_api_key(api_key: str) -> str:
+    """Hash an API key for storage and lookup."""
+    return hashlib.blake2b(api_key.encode(), digest_size=32).hexdigest()
+
+
+def _legacy_api_key_hash(api_key: str) -> str:
+    """SHA-256 hash used for API keys created before the switch to BLAKE2b."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
 async def create_user(email: str, password: str) -> Optional[int]:
     """Create a new user.
 
     Returns:
         user_id if successful, None if email already exists
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    # bcrypt is CPU-bound; keep it off the event loop
+    password_hash = await asyncio.to_thread(hash_password, password)
+
+    async with pool.writer() as db:
         try:
             cursor = await db.execute("""
                 INSERT INTO users (email, password_hash)
                 VALUES (?, ?)
-            """, (email, hash_password(password)))
+            """, (email, password_hash))
             await db.commit()
             return cursor.lastrowid
         except aiosqlite.IntegrityError:
@@ -149,8 +347,7 @@ async def authenticate_user(email: str, password: str) -> Optional[dict]:
     Returns:
         User dict with id and email if successful, None otherwise
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.acquire() as db:
         async with db.execute("""
             SELECT id, email, password_hash, is_active
             FROM users
@@ -158,12 +355,12 @@ async def authenticate_user(email: str, password: str) -> Optional[dict]:
         """, (email,)) as cursor:
             user = await cursor.fetchone()
 
-            if not user or not user["is_active"]:
-                return None
+    if not user or not user["is_active"]:
+        return None
 
-            if verify_password(password, user["password_hash"]):
-                return {"id": user["id"], "email": user["email"]}
-            return None
+    if await asyncio.to_thread(verify_password, password, user["password_hash"]):
+        return {"id": user["id"], "email": user["email"]}
+    return None
 
 
 async def create_api_key_for_user(user_id: int, plan_tier: str = "free") -> str:
@@ -174,7 +371,7 @@ async def create_api_key_for_user(user_id: int, plan_tier: str = "free") -> str:
     """
     full_key, key_hash, key_prefix = generate_api_key()
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("""
             INSERT INTO api_keys (user_id, key_hash, key_prefix, plan_tier)
             VALUES (?, ?, ?, ?)
@@ -190,20 +387,43 @@ async def verify_api_key(api_key: str) -> Optional[dict]:
     Returns:
         Dict with api_key_id, user_id, plan_tier if valid, None otherwise
     """
-    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    key_hash = hash_api_key(api_key)
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT ak.id, ak.user_id, ak.plan_tier, u.is_active as user_active
-            FROM api_keys ak
-            JOIN users u ON ak.user_id = u.id
-            WHERE ak.key_hash = ? AND ak.is_active = 1
-        """, (key_hash,)) as cursor:
-            row = await cursor.fetchone()
+    key_info = _api_key_cache.get(key_hash)
+    if key_info is None:
+        key_info = await _lookup_api_key(api_key, key_hash)
+        if key_info is not None:
+            _api_key_cache[key_hash] = key_info
+    return key_info
+
+
+async def _lookup_api_key(api_key: str, key_hash: str) -> Optional[dict]:
+    """Look up an active API key by its current or legacy SHA-256 hash.
+
+    Keys still stored under the legacy digest are re-hashed in place.
+    """
+    legacy_hash = _legacy_api_key_hash(api_key)
+    async with pool.acquire() as db:
+        async with db.execute(VERIFY_KEY_SQL, (key_hash, legacy_hash)) as cursor:
+            rows = await cursor.fetchall()
+
+    # Prefer the current hash if both forms are somehow present
+    row = next((r for r in rows if r["key_hash"] == key_hash), rows[0] if rows else None)
+    if not row or not row["user_active"]:
+        return None
+
+    if row["key_hash"] == legacy_hash:
+        async with pool.writer() as db:
+            await db.execute("""
+                UPDATE api_keys SET key_hash = ? WHERE key_hash = ?
+            """, (key_hash, legacy_hash))
+            await db.commit()
 
-            if not row or not row["user_active"]:
-                return None
+    return {
+        "api_key_id": row["id"],
+        "user_id": row["user_id"],
+        "plan_tier": row["plan_tier"]
+    }
 
 
 async def get_user_id_by_email(email: str) -> Optional[int]:
@@ -215,28 +435,76 @@ async def get_user_id_by_email(email: str) -> Optional[int]:
     Returns:
         User ID if found and active, None otherwise
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.acquire() as db:
         async with db.execute("""
             SELECT id FROM users WHERE email = ? AND is_active = 1
         """, (email,)) as cursor:
             row = await cursor.fetchone()
             return row[0] if row else None
 
-            return {
-                "api_key_id": row["id"],
-                "user_id": row["user_id"],
-                "plan_tier": row["plan_tier"]
-            }
-
 
 async def log_usage(api_key_id: int, endpoint: str, response_time_ms: int, status_code: int):
-    """Log an API usage event."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            INSERT INTO usage_logs (api_key_id, endpoint, response_time_ms, status_code)
-            VALUES (?, ?, ?, ?)
-        """, (api_key_id, endpoint, response_time_ms, status_code))
-        await db.commit()
+    """Queue an API usage event for the background log writer."""
+    row = (api_key_id, endpoint, response_time_ms, status_code)
+    if _log_writer_task is None or _log_writer_task.done():
+        # Nothing is draining the queue; write through instead
+        await _write_usage_rows([row])
+    else:
+        try:
+            _log_queue.put_nowait(row)
+        except asyncio.QueueFull:
+            logger.error(f"Usage log queue full, dropping event for {endpoint}")
+            return
+
+    counter_key = (api_key_id, _utc_day())
+    if counter_key in _usage_counters:
+        _usage_counters[counter_key] += 1
+
+
+async def _log_writer(queue: asyncio.Queue):
+    """Write queued usage events in batches until a None sentinel arrives."""
+    while True:
+        rows = [await queue.get()]
+        # Give concurrent requests a moment to join the batch
+        await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        while len(rows) < LOG_BATCH_SIZE and not queue.empty():
+            rows.append(queue.get_nowait())
+
+        stopping = None in rows
+        rows = [row for row in rows if row is not None]
+        if rows:
+            await _write_usage_rows(rows)
+        _purge_usage_counters()
+        if stopping:
+            return
+
+
+async def _write_usage_rows(rows: list[tuple]):
+    """Insert a batch of usage events and update the hourly rollup in one transaction."""
+    global _rollup_pruned_hour
+    # Aggregate the batch per (endpoint, status bucket) before touching the rollup
+    rollup = {}
+    for _, endpoint, response_time_ms, status_code in rows:
+        bucket = rollup.setdefault((endpoint, (status_code or 0) // 100), [0, 0, 0])
+        bucket[0] += 1
+        if response_time_ms is not None:
+            bucket[1] += 1
+            bucket[2] += response_time_ms
+
+    try:
+        async with pool.writer() as db:
+            await db.executemany(INSERT_USAGE_SQL, rows)
+            await db.executemany(UPSERT_ROLLUP_SQL, [
+                (endpoint, status_bucket, count, rt_count, total_rt)
+                for (endpoint, status_bucket), (count, rt_count, total_rt) in rollup.items()
+            ])
+            hour = datetime.utcnow().strftime("%Y-%m-%d %H")
+            if hour != _rollup_pruned_hour:
+                await db.execute(PRUNE_ROLLUP_SQL)
+            await db.commit()
+        _rollup_pruned_hour = hour
+    except Exception as e:
+        logger.error(f"Failed to write {len(rows)} usage logs: {str(e)}")
 
 
 async def get_usage_stats(api_key_id: int, days: int = 1) -> dict:
@@ -245,35 +513,22 @@ async def get_usage_stats(api_key_id: int, days: int = 1) -> dict:
     Returns:
         Dict with total_calls, calls_today, plan_tier, rate_limit
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        # Get total calls in the specified time period
+    async with pool.acquire() as db:
+        # Plan tier and call count for the period in one round trip
         async with db.execute("""
-            SELECT COUNT(*) as count
-            FROM usage_logs
-            WHERE api_key_id = ?
-            AND timestamp >= datetime('now', ? || ' days')
-        """, (api_key_id, -days)) as cursor:
-            row = await cursor.fetchone()
-            total_calls = row["count"] if row else 0
-
-        # Get plan tier
-        async with db.execute("""
-            SELECT plan_tier FROM api_keys WHERE id = ?
-        """, (api_key_id,)) as cursor:
+            SELECT ak.plan_tier,
+                (SELECT COUNT(*)
+                 FROM usage_logs
+                 WHERE api_key_id = ak.id
+                 AND timestamp >= datetime('now', ? || ' days')) as count
+            FROM api_keys ak
+            WHERE ak.id = ?
+        """, (-days, api_key_id)) as cursor:
             row = await cursor.fetchone()
             plan_tier = row["plan_tier"] if row else "free"
+            total_calls = row["count"] if row else 0
 
-        # Get rate limits from env
-        rate_limits = {
-            "free": int(os.getenv("RATE_LIMIT_FREE", "10")),
-            "starter": int(os.getenv("RATE_LIMIT_STARTER", "500")),
-            "pro": int(os.getenv("RATE_LIMIT_PRO", "5000")),
-            "enterprise": int(os.getenv("RATE_LIMIT_ENTERPRISE", "999999"))
-        }
-
-        limit = rate_limits.get(plan_tier, 10)
+        limit = RATE_LIMITS.get(plan_tier, 10)
         remaining = max(0, limit - total_calls)
 
         return {
@@ -285,14 +540,57 @@ async def get_usage_stats(api_key_id: int, days: int = 1) -> dict:
         }
 
 
+def _utc_day() -> str:
+    """Current UTC date, matching SQLite's date('now')."""
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _purge_usage_counters():
+    """Drop counters left over from previous days."""
+    global _usage_counters_day
+    today = _utc_day()
+    if today == _usage_counters_day:
+        return
+    for counter_key in [k for k in _usage_counters if k[1] != today]:
+        del _usage_counters[counter_key]
+    _usage_counters_day = today
+
+
+async def get_daily_usage(api_key_id: int, cap: int) -> int:
+    """Get an API key's calls so far today (UTC).
+
+    The first lookup of the day counts usage_logs, stopping once cap is
+    reached; after that the in-memory counter kept by log_usage is used.
+
+    Returns:
+        The number of calls today, or at least cap if the limit was hit
+    """
+    global _usage_counters_lock
+    counter_key = (api_key_id, _utc_day())
+    count = _usage_counters.get(counter_key)
+    if count is not None:
+        return count
+
+    if _usage_counters_lock is None:
+        _usage_counters_lock = asyncio.Lock()
+    async with _usage_counters_lock:
+        count = _usage_counters.get(counter_key)
+        if count is None:
+            async with pool.acquire() as db:
+                async with db.execute(COUNT_USAGE_SQL, (api_key_id, cap)) as cursor:
+                    row = await cursor.fetchone()
+                    count = row[0] if row else 0
+            _usage_counters[counter_key] = count
+    return count
+
+
 async def list_api_keys_for_user(user_id: int) -> list[dict]:
     """List all API keys for a user.
 
     Returns:
         List of dicts with key_prefix, plan_tier, created_at, is_active
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.acquire() as db:
         async with db.execute("""
             SELECT id, key_prefix, plan_tier, created_at, is_active
             FROM api_keys
@@ -0,0 +1,98 @@
+"""
+Shared aiosqlite connection pool.
+
+One dedicated writer connection plus a small set of reader connections,
+all opened lazily on first use and tuned with WAL pragmas once.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiosqlite
+
+DB_PATH = os.getenv("DATABASE_URL", "sqlite:///./data.db").replace("sqlite:///", "")
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=memory",
+    "PRAGMA cache_size=-64000",
+)
+
+
+class ConnectionPool:
+    """Pool of long-lived aiosqlite connections for a single database file."""
+
+    def __init__(self, db_path: str, size: int = 4, read_only_readers: bool = False):
+        self.db_path = db_path
+        self.size = size
+        self.read_only_readers = read_only_readers
+        self._readers: Optional[asyncio.Queue] = None
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._connections: list[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        if read_only:
+            # SQLite itself rejects writes on these, so they never take the write lock
+            db = await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        else:
+            db = await aiosqlite.connect(self.db_path)
+        db.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await db.execute(pragma)
+        self._connections.append(db)
+        return db
+
+    async def open(self):
+        """Open the writer and reader connections if not already open."""
+        async with self._open_lock:
+            if self._readers is not None:
+                return
+            # Writer first: it creates the file and switches it to WAL for the readers
+            self._writer = await self._connect()
+            readers = asyncio.Queue()
+            for _ in range(self.size):
+                readers.put_nowait(await self._connect(read_only=self.read_only_readers))
+            self._readers = readers
+
+    async def close(self):
+        """Close every pooled connection."""
+        async with self._open_lock:
+            for db in self._connections:
+                await db.close()
+            self._connections = []
+            self._readers = None
+            self._writer = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Check out a reader connection for the duration of the block."""
+        if self._readers is None:
+            await self.open()
+        readers = self._readers
+        db = await readers.get()
+        try:
+            yield db
+        finally:
+            readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Hold the single writer connection for the duration of the block."""
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            db = self._writer
+            try:
+                yield db
+            finally:
+                # Never hand the next caller a half-finished transaction
+                if db.in_transaction:
+                    await db.rollback()
+
+
+pool = ConnectionPool(DB_PATH, size=POOL_SIZE)
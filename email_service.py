@@ -8,16 +8,59 @@ Supports:
 
 Set EMAIL_SERVICE=sendgrid|mailgun|smtp in .env
 """
+import asyncio
 import os
 from typing import Optional
 import logging
+from jinja2 import Template
 
 logger = logging.getLogger(__name__)
 
+# Full welcome template from gumroad_integration when available, resolved once
+try:
+    from gumroad_integration import generate_welcome_email_html
+except ImportError:
+    generate_welcome_email_html = None
+
+# Fallback simple template
+_WELCOME_TMPL = Template("""
+        <html>
+        <body>
+            <h1>Welcome to {{ product_name }}!</h1>
+            <p>Your API key: <code>{{ api_key }}</code></p>
+            <p>Plan: {{ plan_tier }}</p>
+            <p><a href="{{ docs_url }}">View Documentation</a></p>
+        </body>
+        </html>
+        """, autoescape=True)
+
 EMAIL_SERVICE = os.getenv("EMAIL_SERVICE", "none")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@yourapi.com")
 FROM_NAME = os.getenv("FROM_NAME", "Your API")
 
+# Shared HTTP session for SendGrid/Mailgun so connections are reused across emails
+_http_session = None
+
+
+async def _get_session():
+    """Return the shared aiohttp session, creating it on first use."""
+    global _http_session
+    import aiohttp
+
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, keepalive_timeout=60)
+        )
+    return _http_session
+
+
+async def close_email_service():
+    """Close the shared HTTP session."""
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
 
 async def send_email(
     to_email: str,
@@ -64,37 +107,37 @@ async def _send_via_sendgrid(
     html_content: str,
     text_content: Optional[str]
 ) -> bool:
-    """Send email via SendGrid API."""
+    """Send email via SendGrid v3 API."""
     try:
-        import sendgrid
-        from sendgrid.helpers.mail import Mail, Email, To, Content
-
         sg_api_key = os.getenv("SENDGRID_API_KEY")
         if not sg_api_key:
             logger.error("SENDGRID_API_KEY not set")
             return False
 
-        sg = sendgrid.SendGridAPIClient(api_key=sg_api_key)
-        
-        from_email_obj = Email(FROM_EMAIL, FROM_NAME)
-        to_email_obj = To(to_email)
-        
-        mail = Mail(
-            from_email=from_email_obj,
-            to_emails=to_email_obj,
-            subject=subject,
-            html_content=Content("text/html", html_content)
-        )
-        
+        # SendGrid requires text/plain to come before text/html
+        content = []
         if text_content:
-            mail.add_content(Content("text/plain", text_content))
-
-        response = sg.send(mail)
-        logger.info(f"SendGrid email sent to {to_email}: {response.status_code}")
-        return response.status_code in [200, 201, 202]
+            content.append({"type": "text/plain", "value": text_content})
+        content.append({"type": "text/html", "value": html_content})
+
+        payload = {
+            "personalizations": [{"to": [{"email": to_email}]}],
+            "from": {"email": FROM_EMAIL, "name": FROM_NAME},
+            "subject": subject,
+            "content": content
+        }
+
+        session = await _get_session()
+        async with session.post(
+            "https://api.sendgrid.com/v3/mail/send",
+            headers={"Authorization": f"Bearer {sg_api_key}"},
+            json=payload
+        ) as response:
+            logger.info(f"SendGrid email sent to {to_email}: {response.status}")
+            return response.status in [200, 201, 202]
 
     except ImportError:
-        logger.error("sendgrid package not installed. Run: pip install sendgrid")
+        logger.error("aiohttp package not installed. Run: pip install aiohttp")
         return False
     except Exception as e:
         logger.error(f"SendGrid error: {str(e)}")
@@ -118,24 +161,24 @@ async def _send_via_mailgun(
             logger.error("MAILGUN_DOMAIN or MAILGUN_API_KEY not set")
             return False
 
-        async with aiohttp.ClientSession() as session:
-            data = {
-                "from": f"{FROM_NAME} <{FROM_EMAIL}>",
-                "to": to_email,
-                "subject": subject,
-                "html": html_content
-            }
-            if text_content:
-                data["text"] = text_content
-
-            async with session.post(
-                f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
-                auth=aiohttp.BasicAuth("api", mailgun_api_key),
-                data=data
-            ) as response:
-                result = await response.json()
-                logger.info(f"Mailgun email sent to {to_email}: {response.status}")
-                return response.status == 200
+        data = {
+            "from": f"{FROM_NAME} <{FROM_EMAIL}>",
+            "to": to_email,
+            "subject": subject,
+            "html": html_content
+        }
+        if text_content:
+            data["text"] = text_content
+
+        session = await _get_session()
+        async with session.post(
+            f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
+            auth=aiohttp.BasicAuth("api", mailgun_api_key),
+            data=data
+        ) as response:
+            result = await response.json()
+            logger.info(f"Mailgun email sent to {to_email}: {response.status}")
+            return response.status == 200
 
     except ImportError:
         logger.error("aiohttp package not installed. Run: pip install aiohttp")
@@ -153,32 +196,8 @@ async def _send_via_smtp(
 ) -> bool:
     """Send email via SMTP (fallback method)."""
     try:
-        import smtplib
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-
-        smtp_host = os.getenv("SMTP_HOST", "localhost")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_pass = os.getenv("SMTP_PASSWORD")
-        smtp_tls = os.getenv("SMTP_TLS", "true").lower() == "true"
-
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
-        msg["To"] = to_email
-
-        if text_content:
-            msg.attach(MIMEText(text_content, "plain"))
-        msg.attach(MIMEText(html_content, "html"))
-
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            if smtp_tls:
-                server.starttls()
-            if smtp_user and smtp_pass:
-                server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-
+        # smtplib blocks for the whole handshake; run it in a worker thread
+        await asyncio.to_thread(_send_smtp_sync, to_email, subject, html_content, text_content)
         logger.info(f"SMTP email sent to {to_email}")
         return True
 
@@ -187,6 +206,40 @@ async def _send_via_smtp(
         return False
 
 
+def _send_smtp_sync(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str]
+):
+    """Build and send a message with smtplib."""
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    smtp_host = os.getenv("SMTP_HOST", "localhost")
+    smtp_port = int(os.getenv("SMTP_PORT", "587"))
+    smtp_user = os.getenv("SMTP_USER")
+    smtp_pass = os.getenv("SMTP_PASSWORD")
+    smtp_tls = os.getenv("SMTP_TLS", "true").lower() == "true"
+
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
+    msg["To"] = to_email
+
+    if text_content:
+        msg.attach(MIMEText(text_content, "plain"))
+    msg.attach(MIMEText(html_content, "html"))
+
+    with smtplib.SMTP(smtp_host, smtp_port) as server:
+        if smtp_tls:
+            server.starttls()
+        if smtp_user and smtp_pass:
+            server.login(smtp_user, smtp_pass)
+        server.send_message(msg)
+
+
 async def send_welcome_email(
     user_email: str,
     api_key: str,
@@ -209,23 +262,16 @@ async def send_welcome_email(
     """
     subject = f"Welcome to {product_name} - Your API Key"
     
-    # Import welcome email template from gumroad_integration
-    try:
-        from gumroad_integration import generate_welcome_email_html
+    if generate_welcome_email_html is not None:
         html_content = generate_welcome_email_html(
             user_email, api_key, plan_tier, product_name, docs_url
         )
-    except ImportError:
-        # Fallback simple template
-        html_content = f"""
-        <html>
-        <body>
-            <h1>Welcome to {product_name}!</h1>
-            <p>Your API key: <code>{api_key}</code></p>
-            <p>Plan: {plan_tier}</p>
-            <p><a href="{docs_url}">View Documentation</a></p>
-        </body>
-        </html>
-        """
+    else:
+        html_content = _WELCOME_TMPL.render(
+            product_name=product_name,
+            api_key=api_key,
+            plan_tier=plan_tier,
+            docs_url=docs_url
+        )
 
     return await send_email(user_email, subject, html_content)
@@ -2,13 +2,41 @@
 Centralized error handling with enhanced error messages.
 """
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from types import MappingProxyType
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
+UPGRADE_URL = "https://yourapi.com/pricing"
+API_KEY_HELP = "Get your API key at https://yourapi.com/dashboard"
+API_KEY_HEADER_FORMAT = "X-API-Key: your_api_key_here"
+
+# Map common status codes to helpful messages
+_HELPFUL_MESSAGES = MappingProxyType({
+    400: "Bad Request - Check your request parameters",
+    401: "Unauthorized - Invalid or missing API key",
+    403: "Forbidden - Insufficient permissions",
+    404: "Not Found - Endpoint or resource doesn't exist",
+    405: "Method Not Allowed - Check HTTP method (GET/POST/etc)",
+    429: "Too Many Requests - Rate limit exceeded",
+    500: "Internal Server Error - Please contact support",
+    503: "Service Unavailable - Try again later"
+})
+
+# The 500 body is constant apart from the path, so only the path is encoded per error
+_GENERAL_ERROR_PREFIX = orjson.dumps({
+    "success": False,
+    "error": "Internal server error",
+    "details": {
+        "message": "An unexpected error occurred",
+        "support": "Contact support@yourapi.com with the request ID"
+    }
+})[:-1] + b',"path":'
+
 
 class APIError(Exception):
     """Base exception for API errors."""
@@ -28,7 +56,7 @@ class RateLimitError(APIError):
             details={
                 "limit": limit,
                 "reset_time": reset_time,
-                "upgrade_url": "https://yourapi.com/pricing"
+                "upgrade_url": UPGRADE_URL
             }
         )
 
@@ -40,8 +68,8 @@ class InvalidAPIKeyError(APIError):
             status_code=401,
             message="Invalid or missing API key",
             details={
-                "help": "Get your API key at https://yourapi.com/dashboard",
-                "header_format": "X-API-Key: your_api_key_here"
+                "help": API_KEY_HELP,
+                "header_format": API_KEY_HEADER_FORMAT
             }
         )
 
@@ -58,29 +86,29 @@ class ResourceNotFoundError(APIError):
 
 async def api_error_handler(request: Request, exc: APIError):
     """Handle custom API errors."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
             "error": exc.message,
             "details": exc.details,
-            "path": str(request.url.path)
+            "path": request.url.path
         }
     )
 
 
 async def validation_error_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors with detailed messages."""
-    errors = []
-    for error in exc.errors():
-        field = " -> ".join([str(loc) for loc in error["loc"]])
-        errors.append({
-            "field": field,
+    errors = [
+        {
+            "field": " -> ".join(map(str, error["loc"])),
             "message": error["msg"],
             "type": error["type"]
-        })
+        }
+        for error in exc.errors()
+    ]
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "success": False,
@@ -89,53 +117,37 @@ async def validation_error_handler(request: Request, exc: RequestValidationError
                 "errors": errors,
                 "help": "Check API documentation at /docs"
             },
-            "path": str(request.url.path)
+            "path": request.url.path
         }
     )
 
 
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """Handle HTTP exceptions with enhanced messages."""
-    # Map common status codes to helpful messages
-    helpful_messages = {
-        400: "Bad Request - Check your request parameters",
-        401: "Unauthorized - Invalid or missing API key",
-        403: "Forbidden - Insufficient permissions",
-        404: "Not Found - Endpoint or resource doesn't exist",
-        405: "Method Not Allowed - Check HTTP method (GET/POST/etc)",
-        429: "Too Many Requests - Rate limit exceeded",
-        500: "Internal Server Error - Please contact support",
-        503: "Service Unavailable - Try again later"
-    }
-    
-    message = helpful_messages.get(exc.status_code, exc.detail)
+    path = request.url.path
+    detail_str = str(exc.detail)
+    message = _HELPFUL_MESSAGES.get(exc.status_code, detail_str)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
             "error": message,
-            "details": {"original_error": str(exc.detail)} if exc.detail != message else {},
-            "path": str(request.url.path)
+            "details": {} if detail_str == message else {"original_error": detail_str},
+            "path": path
         }
     )
 
 
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions."""
-    logger.error(f"Unexpected error on {request.url.path}: {str(exc)}", exc_info=True)
+    path = request.url.path
+    logger.error(f"Unexpected error on {path}: {exc}", exc_info=True)
     
-    return JSONResponse(
+    return Response(
+        content=_GENERAL_ERROR_PREFIX + orjson.dumps(path) + b"}",
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content={
-            "success": False,
-            "error": "Internal server error",
-            "details": {
-                "message": "An unexpected error occurred",
-                "support": "Contact support@yourapi.com with the request ID"
-            },
-            "path": str(request.url.path)
-        }
+        media_type="application/json"
     )
 
 
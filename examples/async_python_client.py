@@ -0,0 +1,97 @@
+"""
+Async Python client example for Email Finder API
+"""
+import asyncio
+from typing import List, Dict
+
+import httpx
+import orjson
+
+
+class AsyncEmailFinderClient:
+    """Async Email Finder API client for fanning out many calls.
+    
+    Requests are multiplexed over a shared HTTP/2 connection, so callers can
+    asyncio.gather() many find_email calls. Requires ``httpx[http2]``.
+    """
+    
+    def __init__(self, api_key: str, base_url: str = "https://api.example.com"):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "X-API-Key": api_key,
+                "Content-Type": "application/json"
+            },
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    
+    async def _post(self, path: str, payload: Dict) -> Dict:
+        response = await self._client.post(path, content=orjson.dumps(payload))
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
+    async def find_email(
+        self,
+        domain: str,
+        first_name: str,
+        last_name: str
+    ) -> Dict:
+        """Find email patterns for a person."""
+        return await self._post("/api/find-email", {
+            "domain": domain,
+            "first_name": first_name,
+            "last_name": last_name
+        })
+    
+    async def verify_email(self, email: str) -> Dict:
+        """Verify if an email address is deliverable."""
+        return await self._post("/api/verify-email", {"email": email})
+    
+    async def verify_domain(self, domain: str) -> Dict:
+        """Check if domain has valid mail configuration."""
+        return await self._post("/api/verify-domain", {"domain": domain})
+    
+    async def bulk_find(
+        self,
+        domain: str,
+        names: List[Dict[str, str]]
+    ) -> Dict:
+        """Find emails for multiple people at once."""
+        return await self._post("/api/bulk-find", {
+            "domain": domain,
+            "names": names
+        })
+    
+    async def get_usage(self) -> Dict:
+        """Get current API usage statistics."""
+        response = await self._client.get("/api/usage")
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
+    async def aclose(self):
+        """Close the underlying connection pool."""
+        await self._client.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+# Example usage
+if __name__ == "__main__":
+    async def main():
+        async with AsyncEmailFinderClient(api_key="your_api_key_here") as client:
+            # Fan out lookups over one multiplexed connection
+            results = await asyncio.gather(
+                client.find_email("example.com", "John", "Doe"),
+                client.find_email("example.com", "Jane", "Smith")
+            )
+            for result in results:
+                print("Found emails:", result["emails"])
+
+    asyncio.run(main())
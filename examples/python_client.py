@@ -2,7 +2,9 @@
 Python client example for Email Finder API
 """
 import requests
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Optional
+from urllib3.util.retry import Retry
 
 
 class EmailFinderClient:
@@ -15,6 +17,26 @@ class EmailFinderClient:
             "X-API-Key": api_key,
             "Content-Type": "application/json"
         }
+        # One pooled session so repeated calls reuse the same keep-alive connection
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=100,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+    
+    def close(self):
+        """Release pooled connections."""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def find_email(
         self,
@@ -23,9 +45,8 @@ class EmailFinderClient:
         last_name: str
     ) -> Dict:
         """Find email patterns for a person."""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/find-email",
-            headers=self.headers,
             json={
                 "domain": domain,
                 "first_name": first_name,
@@ -37,9 +58,8 @@ class EmailFinderClient:
     
     def verify_email(self, email: str) -> Dict:
         """Verify if an email address is deliverable."""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/verify-email",
-            headers=self.headers,
             json={"email": email}
         )
         response.raise_for_status()
@@ -47,9 +67,8 @@ class EmailFinderClient:
     
     def verify_domain(self, domain: str) -> Dict:
         """Check if domain has valid mail configuration."""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/verify-domain",
-            headers=self.headers,
             json={"domain": domain}
         )
         response.raise_for_status()
@@ -61,9 +80,8 @@ class EmailFinderClient:
         names: List[Dict[str, str]]
     ) -> Dict:
         """Find emails for multiple people at once."""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/bulk-find",
-            headers=self.headers,
             json={
                 "domain": domain,
                 "names": names
@@ -74,9 +92,8 @@ class EmailFinderClient:
     
     def get_usage(self) -> Dict:
         """Get current API usage statistics."""
-        response = requests.get(
-            f"{self.base_url}/api/usage",
-            headers=self.headers
+        response = self.session.get(
+            f"{self.base_url}/api/usage"
         )
         response.raise_for_status()
         return response.json()
@@ -112,3 +129,5 @@ if __name__ == "__main__":
     # Check usage
     usage = client.get_usage()
     print(f"Requests today: {usage['total_calls']}/{usage['rate_limit']}")
+    
+    client.close()
@@ -14,10 +14,11 @@ Setup:
 """
 
 import hmac
-import hashlib
 import json
+import secrets
 from typing import Optional
 import os
+from jinja2 import Environment
 
 
 def verify_gumroad_signature(payload: bytes, signature: str, secret: str) -> bool:
@@ -32,13 +33,15 @@ def verify_gumroad_signature(payload: bytes, signature: str, secret: str) -> boo
     Returns:
         True if signature is valid
     """
-    expected_signature = hmac.new(
-        secret.encode('utf-8'),
-        payload,
-        hashlib.sha256
-    ).hexdigest()
+    expected = hmac.digest(secret.encode('utf-8'), payload, 'sha256')
 
-    return hmac.compare_digest(expected_signature, signature)
+    # Compare raw digests; a missing or non-hex header is simply invalid
+    try:
+        provided = bytes.fromhex(signature)
+    except (TypeError, ValueError):
+        return False
+
+    return hmac.compare_digest(expected, provided)
 
 
 def parse_gumroad_webhook(data: dict) -> Optional[dict]:
@@ -143,54 +146,40 @@ async def process_gumroad_purchase(webhook_data: dict, database_module) -> dict:
 
 def generate_random_password(length: int = 16) -> str:
     """Generate a secure random password for auto-created accounts."""
-    import secrets
-    import string
-    alphabet = string.ascii_letters + string.digits + string.punctuation
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
-
+    # One urandom read, base64-encoded in C; the password is only ever hashed
+    return secrets.token_urlsafe(length)[:length]
 
-def generate_welcome_email_html(user_email: str, api_key: str, plan_tier: str, product_name: str, docs_url: str) -> str:
-    """
-    Generate HTML welcome email for new customer.
 
-    Args:
-        user_email: Customer email
-        api_key: Generated API key
-        plan_tier: Plan tier name
-        product_name: Product they purchased
-        docs_url: URL to API docs
-
-    Returns:
-        HTML email content
-    """
-    return f"""
+# Compiled once at import; autoescape keeps buyer-supplied values out of the markup
+_WELCOME_ENV = Environment(autoescape=True)
+_WELCOME_TPL = _WELCOME_ENV.from_string("""
     <!DOCTYPE html>
     <html>
     <head>
         <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: #0ea5e9; color: white; padding: 20px; text-align: center; }}
-            .content {{ background: #f9f9f9; padding: 30px; border: 1px solid #ddd; }}
-            .api-key {{ background: #fff; padding: 15px; border: 2px solid #0ea5e9; border-radius: 5px; font-family: monospace; word-break: break-all; }}
-            .cta-button {{ display: inline-block; background: #0ea5e9; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin-top: 20px; }}
-            .footer {{ text-align: center; margin-top: 30px; color: #888; font-size: 12px; }}
+            body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+            .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+            .header { background: #0ea5e9; color: white; padding: 20px; text-align: center; }
+            .content { background: #f9f9f9; padding: 30px; border: 1px solid #ddd; }
+            .api-key { background: #fff; padding: 15px; border: 2px solid #0ea5e9; border-radius: 5px; font-family: monospace; word-break: break-all; }
+            .cta-button { display: inline-block; background: #0ea5e9; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin-top: 20px; }
+            .footer { text-align: center; margin-top: 30px; color: #888; font-size: 12px; }
         </style>
     </head>
     <body>
         <div class="container">
             <div class="header">
-                <h1>Welcome to {product_name}!</h1>
+                <h1>Welcome to {{ product_name }}!</h1>
             </div>
             <div class="content">
                 <p>Hi there,</p>
-                <p>Thank you for purchasing the <strong>{plan_tier.title()} Plan</strong> of {product_name}!</p>
+                <p>Thank you for purchasing the <strong>{{ plan_tier }} Plan</strong> of {{ product_name }}!</p>
 
                 <p>Your account has been automatically created. Here's your API key:</p>
 
                 <div class="api-key">
                     <strong>API Key:</strong><br>
-                    {api_key}
+                    {{ api_key }}
                 </div>
 
                 <p><strong>⚠️ Important:</strong> This is the only time you'll see your full API key. Please save it securely.</p>
@@ -203,14 +192,14 @@ def generate_welcome_email_html(user_email: str, api_key: str, plan_tier: str, p
                 </ul>
 
                 <p>
-                    <a href="{docs_url}" class="cta-button">View Documentation</a>
+                    <a href="{{ docs_url }}" class="cta-button">View Documentation</a>
                 </p>
 
                 <h3>Your Plan Details</h3>
                 <ul>
-                    <li><strong>Email:</strong> {user_email}</li>
-                    <li><strong>Plan:</strong> {plan_tier.title()}</li>
-                    <li><strong>Product:</strong> {product_name}</li>
+                    <li><strong>Email:</strong> {{ user_email }}</li>
+                    <li><strong>Plan:</strong> {{ plan_tier }}</li>
+                    <li><strong>Product:</strong> {{ product_name }}</li>
                 </ul>
 
                 <p>Need help? Just reply to this email!</p>
@@ -218,12 +207,35 @@ def generate_welcome_email_html(user_email: str, api_key: str, plan_tier: str, p
                 <p>Happy building! 🚀</p>
             </div>
             <div class="footer">
-                <p>You received this email because you purchased {product_name} on Gumroad.</p>
+                <p>You received this email because you purchased {{ product_name }} on Gumroad.</p>
             </div>
         </div>
     </body>
     </html>
+""")
+
+
+def generate_welcome_email_html(user_email: str, api_key: str, plan_tier: str, product_name: str, docs_url: str) -> str:
+    """
+    Generate HTML welcome email for new customer.
+
+    Args:
+        user_email: Customer email
+        api_key: Generated API key
+        plan_tier: Plan tier name
+        product_name: Product they purchased
+        docs_url: URL to API docs
+
+    Returns:
+        HTML email content
     """
+    return _WELCOME_TPL.render(
+        user_email=user_email,
+        api_key=api_key,
+        plan_tier=plan_tier.title(),
+        product_name=product_name,
+        docs_url=docs_url
+    )
 
 
 # Example webhook endpoint (add to main.py):
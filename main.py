@@ -1,16 +1,26 @@
-import hashlib
-import random
+import hmac
+import os
 import uuid
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Annotated, List, Optional
 
-from fastapi import FastAPI, Request, HTTPException, Header, Depends
+from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from cachetools import TTLCache
+import orjson
+import xxhash
+
+from db_pool import ConnectionPool, pool
+from email_service import close_email_service
+from error_handlers import RateLimitError
+from rate_limiter import SlidingWindow
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -18,12 +28,104 @@ async def lifespan(app: FastAPI):
     await init_monitors_db()
     yield
     # Shutdown
-    pass
+    await monitors_pool.close()
+    await close_email_service()
+    await pool.close()
 
-app = FastAPI(title="GEO Monitor API", version="1.0.0", lifespan=lifespan)
+DEMO_API_KEY = "demo-key-2024"
+_DEMO_API_KEY_BYTES = DEMO_API_KEY.encode()
+
+# Same body the HTTP exception handler would produce for a 401, minus the path
+_UNAUTHORIZED_PREFIX = orjson.dumps({
+    "success": False,
+    "error": "Unauthorized - Invalid or missing API key",
+    "details": {"original_error": "Invalid or missing API key"},
+})[:-1] + b',"path":'
+
+# Hourly request budget per API key and client address, on top of the key check
+RATE_LIMIT_HOURLY = int(os.getenv("RATE_LIMIT_HOURLY", "1000"))
+rate_limiter = SlidingWindow(window_minutes=60, limit=RATE_LIMIT_HOURLY)
+
+
+async def _send_json(send, status: int, body: bytes, headers: list = ()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class APIKeyMiddleware:
+    """Pure ASGI API-key and rate-limit check for /api/ routes; admin routes use their own key."""
+
+    def __init__(self, app, key: bytes, limiter: Optional[SlidingWindow] = None):
+        self.app = app
+        self.key = key
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path.startswith("/api/") and not path.startswith("/api/admin/"):
+                provided = b""
+                for name, value in scope["headers"]:
+                    if name == b"x-api-key":
+                        provided = value
+                        break
+                if not hmac.compare_digest(provided, self.key):
+                    await _send_json(send, 401, _UNAUTHORIZED_PREFIX + orjson.dumps(path) + b"}")
+                    return
+                # The demo key is shared by every browser, so budget per client address
+                client = scope.get("client")
+                bucket = (provided, client[0] if client else "")
+                if self.limiter is not None and not self.limiter.allow(bucket):
+                    # Exception handlers sit inside user middleware, so render the error here
+                    reset_in = self.limiter.reset_in(bucket)
+                    exc = RateLimitError("demo", self.limiter.limit, f"{reset_in} seconds")
+                    body = orjson.dumps({
+                        "success": False,
+                        "error": exc.message,
+                        "details": exc.details,
+                        "path": path,
+                    })
+                    await _send_json(send, exc.status_code, body, [(b"retry-after", str(reset_in).encode())])
+                    return
+        await self.app(scope, receive, send)
+
+
+class MaybeCORS:
+    """Run CORSMiddleware only for requests that carry an Origin header."""
+
+    def __init__(self, app, **cors_options):
+        self.app = app
+        self.cors = CORSMiddleware(app, **cors_options)
+
+    async def __call__(self, scope, receive, send):
+        # Server-to-server calls never send Origin; skip building Headers for them
+        if scope["type"] == "http":
+            for name, _ in scope["headers"]:
+                if name == b"origin":
+                    await self.cors(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+app = FastAPI(
+    title="GEO Monitor API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
+# Added before CORS so CORS stays outermost and answers preflights itself
+app.add_middleware(APIKeyMiddleware, key=_DEMO_API_KEY_BYTES, limiter=rate_limiter)
 app.add_middleware(
-    CORSMiddleware,
+    MaybeCORS,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
@@ -33,9 +135,7 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-DEMO_API_KEY = "demo-key-2024"
-
-SUPPORTED_LOCATIONS = [
+SUPPORTED_LOCATIONS = (
     "New York", "Los Angeles", "Chicago", "Houston", "Phoenix",
     "Philadelphia", "San Antonio", "San Diego", "Dallas", "San Jose",
     "London", "Manchester", "Birmingham", "Leeds", "Glasgow",
@@ -46,29 +146,62 @@ SUPPORTED_LOCATIONS = [
     "Paris", "Marseille", "Lyon", "Toulouse", "Nice",
     "Mumbai", "Delhi", "Bangalore", "Chennai", "Kolkata",
     "Sao Paulo", "Rio de Janeiro", "Brasilia", "Salvador", "Fortaleza",
-]
+)
+SUPPORTED_LOCATIONS_SET = frozenset(SUPPORTED_LOCATIONS)
+
+# Constant payload, serialized once
+_LOCATIONS_JSON = orjson.dumps({"count": len(SUPPORTED_LOCATIONS), "locations": SUPPORTED_LOCATIONS})
+
+# Reports are deterministic per monitor and UTC day; keyed by (monitor_id, date)
+REPORT_CACHE_TTL = 3600
+# Total bytes of cached report bodies; least recently used reports go first
+REPORT_CACHE_BUDGET_BYTES = 64 * 1024 * 1024
+_report_cache = TTLCache(maxsize=REPORT_CACHE_BUDGET_BYTES, ttl=REPORT_CACHE_TTL, getsizeof=len)
+# Larger reports are streamed without being buffered or cached
+REPORT_CACHE_MAX_BYTES = 256 * 1024
+# Bumped on every monitor write; a report built before a bump is not cached
+_report_generation: dict[str, int] = {}
+
+
+# Reports cover day offsets 0-6; pre-encoded as the per-day hash input
+_DAY_BYTES = tuple(day.to_bytes(8, "little", signed=True) for day in range(7))
+
 
+def _day_bytes(day_offset: int) -> bytes:
+    if 0 <= day_offset < len(_DAY_BYTES):
+        return _DAY_BYTES[day_offset]
+    return day_offset.to_bytes(8, "little", signed=True)
 
-def verify_api_key(x_api_key: str = Header(None)):
-    if x_api_key != DEMO_API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid or missing API key")
-    return x_api_key
 
+def _base_seed(domain: str, keyword: str, location: str) -> int:
+    return xxhash.xxh3_64_intdigest(f"{domain}:{keyword}:{location}".encode())
 
-def seed_random(domain: str, keyword: str, location: str, day_offset: int = 0):
-    seed_str = f"{domain}:{keyword}:{location}:{day_offset}"
-    seed_val = int(hashlib.md5(seed_str.encode()).hexdigest()[:8], 16)
-    return random.Random(seed_val)
+
+def _ranking_fields(h: int):
+    # Each field comes from its own 16-bit slice of the seed hash; building a
+    # random.Random per cell cost several times more than the hash itself
+    position = (h & 0xFFFF) % 100 + 1
+    base_traffic = 5000 - (position * 45) + ((h >> 16) & 0xFFFF) % 401 - 200
+    if base_traffic < 10:
+        base_traffic = 10
+    # 40% up, 30% down, 30% stable
+    trend_roll = ((h >> 32) & 0xFFFF) % 10
+    trend = "up" if trend_roll < 4 else ("down" if trend_roll < 7 else "stable")
+    change = ((h >> 48) & 0xFFFF) % 8 + 1 if trend != "stable" else 0
+    return position, base_traffic, trend, change
+
+
+@lru_cache(maxsize=65536)
+def _ranking_core(base: int, day_offset: int) -> tuple:
+    # Day hash is xxh3 of the day byte keyed by the base, so only one string is
+    # built and hashed per (domain, keyword, location). Keyed on the integer
+    # seed so the cache never holds caller-supplied strings
+    return _ranking_fields(xxhash.xxh3_64_intdigest(_day_bytes(day_offset), base))
 
 
 def generate_ranking(domain: str, keyword: str, location: str, day_offset: int = 0):
-    rng = seed_random(domain, keyword, location, day_offset)
-    position = rng.randint(1, 100)
-    base_traffic = max(10, 5000 - (position * 45) + rng.randint(-200, 200))
-    trends = ["up", "down", "stable"]
-    trend_weights = [0.4, 0.3, 0.3]
-    trend = rng.choices(trends, weights=trend_weights, k=1)[0]
-    change = rng.randint(1, 8) if trend != "stable" else 0
+    # Cached tuple, fresh dict: callers are free to mutate the result
+    position, base_traffic, trend, change = _ranking_core(_base_seed(domain, keyword, location), day_offset)
     return {
         "location": location,
         "position": position,
@@ -78,18 +211,40 @@ def generate_ranking(domain: str, keyword: str, location: str, day_offset: int =
     }
 
 
+def generate_week(domain: str, keyword: str, location: str, dates: List[str]) -> list:
+    """Daily rankings for one keyword/location, one per entry in dates (oldest first)."""
+    base = _base_seed(domain, keyword, location)
+    week = []
+    for day, date in enumerate(dates):
+        position, base_traffic, trend, change = _ranking_fields(xxhash.xxh3_64_intdigest(_day_bytes(day), base))
+        week.append({
+            "location": location,
+            "position": position,
+            "estimated_traffic": base_traffic,
+            "trend": trend,
+            "change": change,
+            "date": date,
+        })
+    return week
+
+
 # ── Request / Response models ──
 
 
+# Longest DNS name; keywords are search phrases, not documents
+MAX_DOMAIN_LENGTH = 253
+MAX_KEYWORD_LENGTH = 200
+
+
 class CheckRankingRequest(BaseModel):
-    domain: str
-    keyword: str
+    domain: str = Field(max_length=MAX_DOMAIN_LENGTH)
+    keyword: str = Field(max_length=MAX_KEYWORD_LENGTH)
     locations: List[str]
 
 
 class MonitorRequest(BaseModel):
-    domain: str
-    keywords: List[str]
+    domain: str = Field(max_length=MAX_DOMAIN_LENGTH)
+    keywords: List[Annotated[str, Field(max_length=MAX_KEYWORD_LENGTH)]]
     locations: List[str]
 
 
@@ -101,25 +256,26 @@ async def landing_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+# Plain def: pure CPU work, so Starlette runs it in the threadpool off the event loop
 @app.post("/api/check-ranking")
-async def check_ranking(body: CheckRankingRequest, api_key: str = Depends(verify_api_key)):
+def check_ranking(body: CheckRankingRequest):
     results = []
     for loc in body.locations:
-        if loc not in SUPPORTED_LOCATIONS:
+        if loc not in SUPPORTED_LOCATIONS_SET:
             results.append({"location": loc, "error": "Unsupported location"})
             continue
         results.append(generate_ranking(body.domain, body.keyword, loc))
     return {
         "domain": body.domain,
         "keyword": body.keyword,
-        "checked_at": datetime.utcnow().isoformat(),
+        "checked_at": datetime.now(timezone.utc).isoformat(),
         "results": results,
     }
 
 
 @app.post("/api/monitor")
-async def create_monitor(body: MonitorRequest, api_key: str = Depends(verify_api_key)):
-    monitor_id = str(uuid.uuid4())[:8]
+async def create_monitor(body: MonitorRequest):
+    monitor_id = uuid.uuid4().hex[:8]
     # Save to database
     await save_monitor(monitor_id, 0, body.domain, body.keywords, body.locations)
     return {
@@ -128,17 +284,27 @@ async def create_monitor(body: MonitorRequest, api_key: str = Depends(verify_api
         "domain": body.domain,
         "keywords_count": len(body.keywords),
         "locations_count": len(body.locations),
-        "next_check": (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+        "next_check": (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat(),
     }
 
 
 @app.get("/api/locations")
-async def list_locations(api_key: str = Depends(verify_api_key)):
-    return {"count": len(SUPPORTED_LOCATIONS), "locations": SUPPORTED_LOCATIONS}
+async def list_locations():
+    return Response(content=_LOCATIONS_JSON, media_type="application/json")
 
 
 @app.get("/api/report/{monitor_id}")
-async def get_report(monitor_id: str, api_key: str = Depends(verify_api_key)):
+async def get_report(monitor_id: str):
+    now = datetime.now(timezone.utc)
+    # One clock read per request; report dates run oldest to today
+    today = now.date()
+    dates = [(today - timedelta(days=6 - day)).isoformat() for day in range(7)]
+    cache_key = (monitor_id, dates[-1])
+    cached = _report_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    generation = _report_generation.get(monitor_id, 0)
     monitor = await get_monitor_by_id(monitor_id)
     if not monitor:
         # Generate a demo report for any ID
@@ -149,39 +315,89 @@ async def get_report(monitor_id: str, api_key: str = Depends(verify_api_key)):
             "locations": ["New York", "London", "Tokyo"],
         }
 
-    report_data = {}
-    for kw in monitor["keywords"]:
-        report_data[kw] = {}
-        for loc in monitor["locations"]:
-            daily = []
-            for day in range(7):
-                ranking = generate_ranking(monitor["domain"], kw, loc, day)
-                ranking["date"] = (datetime.utcnow() - timedelta(days=6 - day)).strftime("%Y-%m-%d")
-                daily.append(ranking)
-            report_data[kw][loc] = daily
-
-    return {
+    # Stream one keyword at a time. Starlette iterates a sync generator in its
+    # threadpool, so building a large report never blocks the event loop
+    parts = []
+    return StreamingResponse(
+        _report_chunks(monitor_id, monitor, now, dates, parts),
+        media_type="application/json",
+        background=BackgroundTask(_cache_report, cache_key, parts, generation),
+    )
+
+
+def _report_chunks(monitor_id: str, monitor: dict, now: datetime, dates: List[str], parts: list):
+    """Yield the report JSON one keyword at a time, keeping chunks in parts while it fits the cache."""
+    size = 0
+    for chunk in _report_body(monitor_id, monitor, now, dates):
+        if size <= REPORT_CACHE_MAX_BYTES:
+            size += len(chunk)
+            if size <= REPORT_CACHE_MAX_BYTES:
+                parts.append(chunk)
+            else:
+                parts.clear()
+        yield chunk
+
+
+def _report_body(monitor_id: str, monitor: dict, now: datetime, dates: List[str]):
+    domain = monitor["domain"]
+    yield orjson.dumps({
         "monitor_id": monitor_id,
-        "domain": monitor["domain"],
-        "generated_at": datetime.utcnow().isoformat(),
+        "domain": domain,
+        "generated_at": now.isoformat(),
         "period": "last_7_days",
-        "data": report_data,
-    }
+    })[:-1] + b',"data":{'
+    # dict.fromkeys drops duplicates the same way building a nested dict did
+    locations = list(dict.fromkeys(monitor["locations"]))
+    for i, kw in enumerate(dict.fromkeys(monitor["keywords"])):
+        yield b"".join((
+            b"," if i else b"",
+            orjson.dumps(kw),
+            b":{",
+            b",".join(orjson.dumps(loc) + b":" + orjson.dumps(generate_week(domain, kw, loc, dates)) for loc in locations),
+            b"}",
+        ))
+    yield b"}}"
+
+
+async def _cache_report(cache_key: tuple, parts: list, generation: int):
+    # Runs after the body is sent; only cache a stream that ran to the end
+    # without outgrowing REPORT_CACHE_MAX_BYTES, and whose monitor was not
+    # written to while it streamed
+    if _report_generation.get(cache_key[0], 0) != generation:
+        return
+    if parts and parts[-1] == b"}}":
+        _report_cache[cache_key] = b"".join(parts)
 
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8772)
-
 # Phase 2: Add SQLite persistence for monitors
-import aiosqlite
-import json as json_lib
-
 DB_PATH = "monitors.db"
 
+# One writer plus read-only readers, so lookups never queue behind a write
+monitors_pool = ConnectionPool(DB_PATH, size=4, read_only_readers=True)
+
+# Stable SQL text so sqlite3 reuses its cached prepared statements
+UPSERT_MONITOR_SQL = """
+    INSERT OR REPLACE INTO monitors (id, api_key_id, domain, keywords, locations)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+SELECT_MONITOR_SQL = """
+    SELECT * FROM monitors WHERE id = ? AND is_active = 1
+"""
+
+SELECT_MONITORS_FOR_KEY_SQL = """
+    SELECT id, api_key_id, domain, keywords, locations, created_at, is_active
+    FROM monitors WHERE api_key_id = ? AND is_active = 1
+"""
+
+SOFT_DELETE_MONITOR_SQL = """
+    UPDATE monitors SET is_active = 0
+    WHERE id = ? AND api_key_id = ?
+"""
+
 async def init_monitors_db():
-    """Initialize monitors database."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Open the monitors connection pool and initialize the schema."""
+    async with monitors_pool.writer() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS monitors (
                 id TEXT PRIMARY KEY,
@@ -193,53 +409,82 @@ async def init_monitors_db():
                 is_active BOOLEAN DEFAULT 1
             )
         """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_monitors_apikey_active
+            ON monitors(api_key_id, is_active)
+        """)
         await db.commit()
 
 async def save_monitor(monitor_id: str, api_key_id: int, domain: str, keywords: list, locations: list):
     """Save monitor to database."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            INSERT OR REPLACE INTO monitors (id, api_key_id, domain, keywords, locations)
-            VALUES (?, ?, ?, ?, ?)
-        """, (monitor_id, api_key_id, domain, json_lib.dumps(keywords), json_lib.dumps(locations)))
+    async with monitors_pool.writer() as db:
+        await db.execute(UPSERT_MONITOR_SQL, (
+            monitor_id, api_key_id, domain, orjson.dumps(keywords).decode(), orjson.dumps(locations).decode()
+        ))
+        await db.commit()
+    _invalidate_report(monitor_id)
+
+async def save_monitors_bulk(monitors: list):
+    """Save many monitors in one transaction.
+
+    Args:
+        monitors: (monitor_id, api_key_id, domain, keywords, locations) tuples
+    """
+    async with monitors_pool.writer() as db:
+        await db.executemany(UPSERT_MONITOR_SQL, [
+            (monitor_id, api_key_id, domain, orjson.dumps(keywords).decode(), orjson.dumps(locations).decode())
+            for monitor_id, api_key_id, domain, keywords, locations in monitors
+        ])
         await db.commit()
+    for monitor in monitors:
+        _invalidate_report(monitor[0])
+
+def _invalidate_report(monitor_id: str):
+    """Drop today's cached report so the next fetch reflects the change."""
+    _report_generation[monitor_id] = _report_generation.get(monitor_id, 0) + 1
+    _report_cache.pop((monitor_id, datetime.now(timezone.utc).date().isoformat()), None)
 
 async def get_monitor_by_id(monitor_id: str):
     """Get a monitor by ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM monitors WHERE id = ? AND is_active = 1
-        """, (monitor_id,)) as cursor:
+    async with monitors_pool.acquire() as db:
+        async with db.execute(SELECT_MONITOR_SQL, (monitor_id,)) as cursor:
             row = await cursor.fetchone()
-            if row:
-                data = dict(row)
-                # Parse JSON fields back to lists
-                if data.get('keywords'):
-                    data['keywords'] = json_lib.loads(data['keywords'])
-                if data.get('locations'):
-                    data['locations'] = json_lib.loads(data['locations'])
-                return data
-            return None
+    if row:
+        data = dict(row)
+        # Parse JSON fields back to lists
+        if data.get('keywords'):
+            data['keywords'] = orjson.loads(data['keywords'])
+        if data.get('locations'):
+            data['locations'] = orjson.loads(data['locations'])
+        return data
+    return None
 
 async def get_monitors_for_api_key(api_key_id: int) -> list:
-    """Get all monitors for an API key."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM monitors WHERE api_key_id = ? AND is_active = 1
-        """, (api_key_id,)) as cursor:
+    """Get all monitors for an API key, with keywords/locations decoded."""
+    async with monitors_pool.acquire() as db:
+        async with db.execute(SELECT_MONITORS_FOR_KEY_SQL, (api_key_id,)) as cursor:
+            # Plain tuples: skip building a Row per result
+            cursor.row_factory = None
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+    return [
+        {
+            "id": r[0],
+            "api_key_id": r[1],
+            "domain": r[2],
+            "keywords": orjson.loads(r[3]),
+            "locations": orjson.loads(r[4]),
+            "created_at": r[5],
+            "is_active": r[6],
+        }
+        for r in rows
+    ]
 
 async def delete_monitor(monitor_id: str, api_key_id: int):
     """Delete a monitor."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            UPDATE monitors SET is_active = 0
-            WHERE id = ? AND api_key_id = ?
-        """, (monitor_id, api_key_id))
+    async with monitors_pool.writer() as db:
+        await db.execute(SOFT_DELETE_MONITOR_SQL, (monitor_id, api_key_id))
         await db.commit()
+    _invalidate_report(monitor_id)
 
 
 
@@ -277,3 +522,9 @@ async def admin_top_users(
     """Get top users by request volume (admin only)."""
     users = await get_usage_by_user(limit=limit)
     return {"success": True, "users": users, "count": len(users)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    # Single worker: the report cache lives in process memory
+    uvicorn.run(app, host="0.0.0.0", port=8772, loop="uvloop", http="httptools")
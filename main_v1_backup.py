@@ -10,6 +10,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
+from cachetools import LRUCache
 
 app = FastAPI(title="GEO Monitor API", version="1.0.0")
 
@@ -26,8 +27,8 @@ templates = Jinja2Templates(directory="templates")
 
 DEMO_API_KEY = "demo-key-2024"
 
-# In-memory store for monitors
-monitors_db: dict = {}
+# In-memory store for monitors, bounded so it can't grow without limit
+monitors_db = LRUCache(maxsize=100_000)
 
 SUPPORTED_LOCATIONS = [
     "New York", "Los Angeles", "Chicago", "Houston", "Phoenix",
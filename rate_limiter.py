@@ -0,0 +1,49 @@
+"""
+In-process sliding-window rate limiting.
+"""
+import time
+from collections import deque
+from typing import Optional
+
+from cachetools import TTLCache
+
+
+class SlidingWindow:
+    """Per-key request counter over a window of one-minute buckets."""
+
+    def __init__(self, window_minutes: int = 60, limit: int = 1000, maxsize: int = 100_000):
+        self.window = window_minutes
+        self.limit = limit
+        # Keys idle for a whole window drop out on their own
+        self._buckets = TTLCache(maxsize=maxsize, ttl=window_minutes * 60)
+
+    def _current(self, key, minute: int) -> deque:
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            buckets = deque(maxlen=self.window)
+        # Rotate out buckets that have slid past the window
+        oldest = minute - self.window + 1
+        while buckets and buckets[0][0] < oldest:
+            buckets.popleft()
+        return buckets
+
+    def allow(self, key, now: Optional[float] = None) -> bool:
+        """Count one request for key; False if the window is already full."""
+        minute = int((time.time() if now is None else now) // 60)
+        buckets = self._current(key, minute)
+        if sum(count for _, count in buckets) >= self.limit:
+            return False
+        if buckets and buckets[-1][0] == minute:
+            buckets[-1][1] += 1
+        else:
+            buckets.append([minute, 1])
+        self._buckets[key] = buckets
+        return True
+
+    def reset_in(self, key, now: Optional[float] = None) -> int:
+        """Seconds until the oldest bucket for key leaves the window."""
+        now = time.time() if now is None else now
+        buckets = self._current(key, int(now // 60))
+        if not buckets:
+            return 0
+        return max(0, int((buckets[0][0] + self.window) * 60 - now))
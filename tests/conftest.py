@@ -0,0 +1,6 @@
+import os
+import sys
+
+# database.py refuses to import with the default JWT secret
+os.environ.setdefault("JWT_SECRET", "test-secret-" + "x" * 32)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+"""
+Regression tests for API key storage and verification.
+"""
+import asyncio
+import hashlib
+
+import pytest
+
+import database
+from db_pool import ConnectionPool
+
+
+@pytest.fixture
+def keys_db(tmp_path, monkeypatch):
+    """Point database at a fresh pool on a throwaway SQLite file."""
+    db_path = str(tmp_path / "keys.db")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{db_path}")
+    monkeypatch.setattr(database, "pool", ConnectionPool(db_path))
+    database._api_key_cache.clear()
+    return db_path
+
+
+def test_verify_api_key(keys_db):
+    async def run():
+        await database.init_database()
+        try:
+            user_id = await database.create_user("tester@example.com", "s3cret-pass")
+            assert user_id is not None
+            api_key = await database.create_api_key_for_user(user_id, plan_tier="pro")
+
+            key_info = await database.verify_api_key(api_key)
+            assert key_info is not None
+            assert key_info["user_id"] == user_id
+            assert key_info["plan_tier"] == "pro"
+            assert set(key_info) == {"api_key_id", "user_id", "plan_tier"}
+
+            assert await database.verify_api_key("bogus-key") is None
+        finally:
+            await database.close_database()
+
+    asyncio.run(run())
+
+
+def test_legacy_sha256_key_is_migrated(keys_db):
+    api_key = "legacy-key-0123456789"
+    legacy_hash = hashlib.sha256(api_key.encode()).hexdigest()
+
+    async def stored_hashes():
+        async with database.pool.acquire() as db:
+            async with db.execute("SELECT key_hash FROM api_keys WHERE key_prefix = 'legacy'") as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def run():
+        await database.init_database()
+        try:
+            user_id = await database.create_user("legacy@example.com", "s3cret-pass")
+            async with database.pool.writer() as db:
+                await db.execute("""
+                    INSERT INTO api_keys (user_id, key_hash, key_prefix, plan_tier)
+                    VALUES (?, ?, 'legacy', 'starter')
+                """, (user_id, legacy_hash))
+                await db.commit()
+
+            key_info = await database.verify_api_key(api_key)
+            assert key_info is not None
+            assert key_info["user_id"] == user_id
+            assert key_info["plan_tier"] == "starter"
+            assert await stored_hashes() == [database.hash_api_key(api_key)]
+
+            # Re-verify against the migrated row, not the cached result
+            database._api_key_cache.clear()
+            assert await database.verify_api_key(api_key) == key_info
+        finally:
+            await database.close_database()
+
+    asyncio.run(run())
+
+
+def test_usage_rollup_drops_hours_past_the_stats_window(keys_db, monkeypatch):
+    monkeypatch.setattr(database, "_rollup_pruned_hour", None)
+
+    async def run():
+        await database.init_database()
+        try:
+            async with database.pool.writer() as db:
+                await db.execute("""
+                    INSERT INTO usage_hourly_rollup (hour, endpoint, status_bucket, count)
+                    VALUES (strftime('%Y-%m-%d %H:00:00', 'now', '-8 days'), '/api/old', 2, 1)
+                """)
+                await db.commit()
+
+            await database.log_usage(1, "/api/new", 5, 200)
+        finally:
+            await database.close_database()
+
+        async with database.pool.acquire() as db:
+            async with db.execute("SELECT endpoint FROM usage_hourly_rollup") as cursor:
+                endpoints = [row[0] for row in await cursor.fetchall()]
+        await database.pool.close()
+        assert endpoints == ["/api/new"]
+
+    asyncio.run(run())
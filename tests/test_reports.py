@@ -0,0 +1,58 @@
+"""
+Tests for report caching.
+"""
+import asyncio
+import importlib
+
+import pytest
+from fastapi.responses import StreamingResponse
+
+from db_pool import ConnectionPool
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """Import the app against a throwaway monitors database."""
+    # StaticFiles checks its directory when the app module is imported
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "static").mkdir()
+    module = importlib.import_module("main")
+    monkeypatch.setattr(module, "monitors_pool", ConnectionPool(str(tmp_path / "monitors.db"), size=4, read_only_readers=True))
+    module._report_cache.clear()
+    return module
+
+
+async def _read(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_report_updated_mid_stream_is_not_cached(main):
+    async def run():
+        await main.init_monitors_db()
+        try:
+            await main.save_monitor("m1", 0, "old.com", ["seo tools"], ["London"])
+
+            response = await main.get_report("m1")
+            assert isinstance(response, StreamingResponse)
+            body = response.body_iterator
+            head = await body.__anext__()
+            assert b'"old.com"' in head
+
+            # Monitor changes while the old report is still being sent
+            await main.save_monitor("m1", 0, "new.com", ["seo tools"], ["London"])
+            async for _ in body:
+                pass
+            await response.background()
+
+            response = await main.get_report("m1")
+            assert isinstance(response, StreamingResponse)
+            assert b'"new.com"' in await _read(response)
+            await response.background()
+
+            cached = await main.get_report("m1")
+            assert not isinstance(cached, StreamingResponse)
+            assert b'"new.com"' in cached.body
+        finally:
+            await main.monitors_pool.close()
+
+    asyncio.run(run())